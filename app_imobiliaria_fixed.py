@@ -1,15 +1,18 @@
 from __future__ import annotations
-import os, sqlite3, requests
+import os, re, sqlite3, requests, json, hashlib, shutil, threading, time
+from xml.sax.saxutils import escape
 from datetime import datetime, date
 from typing import Dict, List, Tuple
 from PIL import Image
 import pandas as pd
 import streamlit as st
+import backup_estado
 
 st.set_page_config(page_title="CRM Imobiliário", layout="wide")
 
 DB_PATH = "imobiliaria.db"
 MEDIA_ROOT = "midia"
+BACKUP_ROOT = "backups"
 IMAGEM_EXTS = {".png",".jpg",".jpeg",".webp"}
 VIDEO_EXTS = {".mp4",".mov",".m4v",".avi"}
 
@@ -48,6 +51,8 @@ def _ensure_column(conn, table, column, coltype):
 
 def init_db():
     conn=get_conn(); c=conn.cursor()
+    # WAL: leitores (inclusive o backup online) não bloqueiam os escritores
+    c.execute("PRAGMA journal_mode=WAL")
     # Vendedores (proprietários)
     c.execute("""CREATE TABLE IF NOT EXISTS vendedores (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -83,6 +88,30 @@ def init_db():
         tipo_evento TEXT,
         observacao TEXT,
         FOREIGN KEY(interessado_id) REFERENCES interessados(id) ON DELETE CASCADE)""")
+    # Changelog de imóveis/mídias (alimenta os feeds incrementais dos portais)
+    c.execute("""CREATE TABLE IF NOT EXISTS changelog (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        property_id INTEGER, origem TEXT, operacao TEXT,
+        data_evento TEXT DEFAULT (datetime('now','localtime')))""")
+    for tabela, pid_col in [("properties","id"),("media","property_id")]:
+        for op, ref in [("INSERT","NEW"),("UPDATE","NEW"),("DELETE","OLD")]:
+            c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{tabela}_{op.lower()}_changelog
+                          AFTER {op} ON {tabela} BEGIN
+                              INSERT INTO changelog (property_id, origem, operacao)
+                              VALUES ({ref}.{pid_col}, '{tabela}', '{op[0]}');
+                          END""")
+    # Mídia movida para outro imóvel: o imóvel de origem também mudou
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_media_move_changelog
+                 AFTER UPDATE OF property_id ON media WHEN OLD.property_id IS NOT NEW.property_id BEGIN
+                     INSERT INTO changelog (property_id, origem, operacao)
+                     VALUES (OLD.property_id, 'media', 'U');
+                 END""")
+    # Watermark de cada feed gerado
+    c.execute("""CREATE TABLE IF NOT EXISTS feeds (
+        nome TEXT PRIMARY KEY, watermark INTEGER, data_geracao TEXT)""")
+    # Busca de mídias por lote de imóveis no feed
+    c.execute("CREATE INDEX IF NOT EXISTS idx_media_property ON media(property_id)")
+    _limpar_changelog(c)
     conn.commit(); conn.close()
 
 # ================= Repositórios =================
@@ -211,7 +240,9 @@ def _set_if_absent(k,val):
 def _advance_index(k,total,step):
     if total>0: st.session_state[k]=(st.session_state.get(k,0)+step)%total
 
+@st.fragment
 def show_media_carousel(pid):
+    # Fragmento: "Anterior/Próxima" reexecuta só o carrossel, não a página inteira
     imgs,vids=carregar_midias(pid)
     if imgs:
         k=f"img_{pid}"; _set_if_absent(k,0)
@@ -553,7 +584,12 @@ def page_interessados():
                 st.success("Interessado salvo!")
 
     st.markdown("---"); st.subheader("Interessados desse imóvel")
-    regs=listar_interessados(imv["id"])
+    show_tabela_interessados(imv["id"])
+
+@st.fragment
+def show_tabela_interessados(pid):
+    # Fragmento: trocar o interessado selecionado reexecuta só a tabela e o histórico
+    regs=listar_interessados(pid)
     if not regs:
         st.info("Nenhum interessado ainda."); return
 
@@ -579,6 +615,11 @@ def page_interessados():
         st.markdown(f"**Status atual:** {selecionado['status']}")
         st.markdown(f"**Contato:** {selecionado['email']} — {selecionado['telefone']}")
 
+    show_historico_interacoes(selecionado)
+
+@st.fragment
+def show_historico_interacoes(selecionado:Dict):
+    # Fragmento: salvar um evento reexecuta só o formulário e a lista de interações
     with st.form(f"form_interacao_{selecionado['id']}", clear_on_submit=True):
         dcol1, dcol2 = st.columns(2)
         with dcol1:
@@ -689,19 +730,457 @@ def page_relatorios():
     df.to_csv(csv_path, index=False, encoding="utf-8-sig")
     st.markdown(f"[Baixar CSV](sandbox:/relatorio_imoveis.csv){xlsx_link}")
 
+# ================= Feed portais (XML/JSON Lines) =================
+FEED_CAMPOS=("id","codigo","titulo","tipo","valor","descricao","quartos","banheiros","vagas","area",
+             "rua","numero","complemento","bairro","cidade_estado","cep","data_cadastro")
+FEED_LOTE=500
+FEED_VALIDADE_DIAS=30  # watermark sem geração há mais tempo expira; o formato volta a feed completo
+_XML_INVALIDOS=re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def _limpar_changelog(c):
+    """Expira watermarks antigos e remove do changelog o que nenhum delta ainda precisa.
+    Sem feed ativo, a próxima geração é completa: sai tudo com mais de um dia
+    (margem para não apagar o que um feed completo em andamento ainda vai usar como delta)."""
+    c.execute("DELETE FROM feeds WHERE data_geracao < datetime('now','localtime',?)",(f"-{FEED_VALIDADE_DIAS} days",))
+    c.execute("""DELETE FROM changelog WHERE seq <= IFNULL((SELECT MIN(watermark) FROM feeds),
+                                                           (SELECT MAX(seq) FROM changelog
+                                                            WHERE data_evento < datetime('now','localtime','-1 day')))""")
+
+def _iter_listagens(conn, desde:int|None, ate:int):
+    """Gera (property_id, imovel|None, imagens, videos) em lotes, sem carregar o feed inteiro.
+    Com `desde`, só os imóveis com changelog em (desde, ate]; imóvel None = removido."""
+    cols=",".join(f"p.{k}" for k in FEED_CAMPOS)
+    c=conn.cursor()
+    if desde is None:
+        c.execute(f"SELECT p.id,{cols} FROM properties p ORDER BY p.id")
+    else:
+        c.execute(f"""SELECT ch.property_id,{cols} FROM (
+                          SELECT property_id FROM changelog WHERE seq>? AND seq<=? GROUP BY property_id
+                      ) ch LEFT JOIN properties p ON p.id=ch.property_id
+                      ORDER BY ch.property_id""",(desde,ate))
+    while True:
+        rows=c.fetchmany(FEED_LOTE)
+        if not rows: break
+        ids=[r[1] for r in rows if r[1] is not None]
+        midias:Dict[int,Tuple[List[str],List[str]]]={i:([],[]) for i in ids}
+        if ids:
+            m=conn.execute(f"SELECT property_id,file_path,media_type FROM media WHERE property_id IN ({','.join(['?']*len(ids))}) ORDER BY id",ids)
+            for pid,fp,tipo in m:
+                if tipo=="imagem": midias[pid][0].append(fp)
+                elif tipo=="video": midias[pid][1].append(fp)
+        for r in rows:
+            imv=dict(zip(FEED_CAMPOS,r[1:])) if r[1] is not None else None
+            imgs,vids=midias.get(r[1],([],[]))
+            yield r[0],imv,imgs,vids
+
+def _media_url(base_url:str, fp:str)->str:
+    return base_url.rstrip("/")+"/"+fp.replace(os.sep,"/") if base_url else fp
+
+def _split_cidade_estado(v:str|None)->Tuple[str,str]:
+    partes=[x.strip() for x in (v or "").split("/",1)]
+    return (partes[0], partes[1] if len(partes)>1 else "")
+
+def _xml_texto(val)->str:
+    # escape() não remove caracteres de controle proibidos no XML 1.0
+    return escape(_XML_INVALIDOS.sub("",str(val)))
+
+def _xml_tag(tag, val, attrs="")->str:
+    if val is None or val=="": return ""
+    return f"<{tag}{attrs}>{_xml_texto(val)}</{tag}>"
+
+def _listagem_xml(pid, imv, imgs, vids, base_url)->str:
+    if imv is None:
+        return f"<Listing removed=\"true\"><ListingID>IMO-{pid:04d}</ListingID></Listing>\n"
+    cidade,uf=_split_cidade_estado(imv["cidade_estado"])
+    aluguel=imv["tipo"]=="Aluguel"
+    midia="".join(f"<Item medium=\"image\"{primario}>{_xml_texto(_media_url(base_url,fp))}</Item>"
+                  for primario,fp in zip([' primary="true"']+[""]*len(imgs),imgs))
+    midia+="".join(f"<Item medium=\"video\">{_xml_texto(_media_url(base_url,fp))}</Item>" for fp in vids)
+    return ("<Listing>"
+            + _xml_tag("ListingID", imv["codigo"] or f"IMO-{pid:04d}")
+            + _xml_tag("Title", imv["titulo"])
+            + _xml_tag("TransactionType", "For Rent" if aluguel else "For Sale")
+            + _xml_tag("ListDate", imv["data_cadastro"])
+            + "<Details>"
+            + _xml_tag("Description", imv["descricao"])
+            + _xml_tag("RentalPrice" if aluguel else "ListPrice", f"{float(imv['valor'] or 0):.2f}", ' currency="BRL"')
+            + _xml_tag("LivingArea", imv["area"], ' unit="square metres"')
+            + _xml_tag("Bedrooms", imv["quartos"])
+            + _xml_tag("Bathrooms", imv["banheiros"])
+            + _xml_tag("Garage", imv["vagas"])
+            + "</Details><Location>"
+            + _xml_tag("Address", imv["rua"])
+            + _xml_tag("StreetNumber", imv["numero"])
+            + _xml_tag("Complement", imv["complemento"])
+            + _xml_tag("Neighborhood", imv["bairro"])
+            + _xml_tag("City", cidade)
+            + _xml_tag("State", uf)
+            + _xml_tag("PostalCode", imv["cep"])
+            + "</Location>"
+            + (f"<Media>{midia}</Media>" if midia else "")
+            + "</Listing>\n")
+
+def _listagem_json(pid, imv, imgs, vids, base_url)->str:
+    if imv is None:
+        d={"acao":"remover","codigo":f"IMO-{pid:04d}"}
+    else:
+        d={"acao":"atualizar",**imv,
+           "imagens":[_media_url(base_url,fp) for fp in imgs],
+           "videos":[_media_url(base_url,fp) for fp in vids]}
+    return json.dumps(d, ensure_ascii=False, default=str)+"\n"
+
+def gerar_feed(dest:str, formato:str="xml", desde:int|None=None, base_url:str="")->Tuple[int,int]:
+    """Grava o feed em `dest` (xml ou jsonl) listagem a listagem.
+    `desde=None` gera o feed completo; um watermark gera só o delta desde ele.
+    Retorna (novo_watermark, qtd_listagens)."""
+    conn=get_conn()
+    tmp=dest+".tmp"; qtd=0
+    try:
+        conn.execute("BEGIN")  # snapshot consistente entre changelog, properties e media
+        ate=conn.execute("SELECT IFNULL(MAX(seq),0) FROM changelog").fetchone()[0]
+        render=_listagem_xml if formato=="xml" else _listagem_json
+        with open(tmp,"w",encoding="utf-8") as f:
+            if formato=="xml":
+                agora=datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+                f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+                f.write(f"<ListingDataFeed><Header>{_xml_tag('PublishDate',agora)}"
+                        f"{_xml_tag('FeedType','delta' if desde is not None else 'full')}"
+                        f"{_xml_tag('Watermark',ate)}</Header>\n<Listings>\n")
+            for pid,imv,imgs,vids in _iter_listagens(conn,desde,ate):
+                f.write(render(pid,imv,imgs,vids,base_url)); qtd+=1
+            if formato=="xml":
+                f.write("</Listings>\n</ListingDataFeed>\n")
+        os.replace(tmp,dest)
+    finally:
+        conn.rollback(); conn.close()
+        if os.path.exists(tmp): os.remove(tmp)
+    return ate,qtd
+
+def obter_watermark(nome:str)->int|None:
+    conn=get_conn(); c=conn.cursor()
+    c.execute("SELECT watermark FROM feeds WHERE nome=?",(nome,))
+    row=c.fetchone(); conn.close()
+    return row[0] if row else None
+
+def salvar_watermark(nome:str, watermark:int):
+    conn=get_conn(); c=conn.cursor()
+    now=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    c.execute("""INSERT INTO feeds (nome,watermark,data_geracao) VALUES (?,?,?)
+                 ON CONFLICT(nome) DO UPDATE SET watermark=excluded.watermark, data_geracao=excluded.data_geracao""",
+              (nome,watermark,now))
+    _limpar_changelog(c)
+    conn.commit(); conn.close()
+
+def page_feed():
+    st.title("Feed para portais")
+    formato_label = st.radio("Formato", ["XML (ZAP/VivaReal)","JSON Lines"], horizontal=True)
+    formato = "xml" if formato_label.startswith("XML") else "jsonl"
+    base_url = st.text_input("URL base das mídias (opcional)", placeholder="https://minhaimobiliaria.com.br/")
+    ultimo = obter_watermark(formato)
+    incremental = st.checkbox("Somente alterações desde a última geração", value=ultimo is not None, disabled=ultimo is None)
+    if ultimo is None:
+        st.caption("Nenhum feed gerado ainda neste formato — a primeira geração é completa.")
+
+    if st.button("Gerar feed"):
+        desde = ultimo if incremental else None
+        dest = f"feed_imoveis_delta_{desde}.{formato}" if incremental else f"feed_imoveis.{formato}"
+        wm, qtd = gerar_feed(dest, formato, desde, base_url.strip())
+        if incremental:
+            # Cada delta tem nome próprio: gerar outro antes do portal buscar não sobrescreve este
+            final = f"feed_imoveis_delta_{desde}-{wm}.{formato}"
+            os.replace(dest, final); dest = final
+        salvar_watermark(formato, wm)
+        st.success(f"{qtd} listagem(ns) gravada(s) em {dest} (watermark {wm}).")
+        st.markdown(f"[Baixar feed](sandbox:/{dest})")
+
+# ================= Backup =================
+BACKUP_PAGINAS=64      # páginas copiadas por passo da API de backup
+BACKUP_PAUSA=0.05      # pausa entre passos (s), deixa os escritores avançarem
+BACKUP_REINICIOS_MAX=3 # reinícios tolerados (escrita na origem) antes de copiar num passo só
+BACKUP_AGENDA=os.path.join(BACKUP_ROOT,"agendamento.json")
+
+def _backup_lock()->threading.RLock:
+    return backup_estado.LOCK
+
+def _sha256(path:str)->str:
+    h=hashlib.sha256()
+    with open(path,"rb") as f:
+        for bloco in iter(lambda: f.read(1<<20), b""): h.update(bloco)
+    return h.hexdigest()
+
+def _blob_path(root:str, sha:str)->str:
+    return os.path.join(root,"midia_store",sha[:2],sha)
+
+def _ler_manifesto(snap_dir:str)->Dict|None:
+    try:
+        with open(os.path.join(snap_dir,"manifest.json"),encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def listar_backups(root:str=BACKUP_ROOT)->List[Dict]:
+    """Snapshots completos (com manifest.json), do mais recente para o mais antigo."""
+    if not os.path.isdir(root): return []
+    snaps=[]
+    for nome in sorted(os.listdir(root), reverse=True):
+        d=os.path.join(root,nome)
+        man=_ler_manifesto(d) if nome!="midia_store" and os.path.isdir(d) else None
+        if man: snaps.append({"nome":nome,"dir":d,**man})
+    return snaps
+
+class _BackupReiniciado(Exception):
+    pass
+
+def _copiar_db_online(src:sqlite3.Connection, dst:sqlite3.Connection, pausa:float=BACKUP_PAUSA):
+    """Copia em passos de BACKUP_PAGINAS. Cada escrita de outra conexão na origem reinicia a cópia;
+    depois de BACKUP_REINICIOS_MAX reinícios copia tudo num passo (em WAL a leitura não trava os escritores)."""
+    estado={"restantes":None,"reinicios":0}
+    def _progresso(status,restantes,total):
+        if estado["restantes"] is not None and restantes>estado["restantes"]:
+            estado["reinicios"]+=1
+            if estado["reinicios"]>BACKUP_REINICIOS_MAX: raise _BackupReiniciado()
+        estado["restantes"]=restantes
+        # `sleep` do backup() só vale para SQLITE_BUSY/LOCKED; a pausa entre passos é feita aqui
+        if pausa: time.sleep(pausa)
+    try:
+        src.backup(dst, pages=BACKUP_PAGINAS, progress=_progresso)
+    except _BackupReiniciado:
+        src.backup(dst, pages=-1)
+
+def _integridade_ok(db_path:str)->bool:
+    conn=sqlite3.connect(db_path)
+    try: return conn.execute("PRAGMA integrity_check").fetchone()[0]=="ok"
+    except sqlite3.DatabaseError: return False
+    finally: conn.close()
+
+def fazer_backup(root:str=BACKUP_ROOT, exigir_integridade:bool=True)->Dict:
+    """Snapshot online do banco + manifesto de MEDIA_ROOT.
+    Mídias vão para um store por sha256 compartilhado entre snapshots; só arquivos novos são copiados.
+    Com exigir_integridade=False um banco que falha no integrity_check é mantido, marcado "integro": False."""
+    with _backup_lock():
+        os.makedirs(root,exist_ok=True)
+        base=datetime.now().strftime("%Y%m%d-%H%M%S"); nome=base; n=1
+        while os.path.exists(os.path.join(root,nome)):
+            nome=f"{base}-{n}"; n+=1
+        snap_dir=os.path.join(root,nome); os.makedirs(snap_dir)
+        try:
+            return _gravar_snapshot(root,nome,snap_dir,exigir_integridade)
+        except BaseException:
+            # Snapshot parcial (sem manifesto) nunca seria limpo pela retenção
+            shutil.rmtree(snap_dir,ignore_errors=True); raise
+
+def _gravar_snapshot(root:str, nome:str, snap_dir:str, exigir_integridade:bool)->Dict:
+    db_dest=os.path.join(snap_dir,os.path.basename(DB_PATH))
+    src=get_conn(); dst=sqlite3.connect(db_dest)
+    try: _copiar_db_online(src,dst)
+    finally: dst.close(); src.close()
+    integro=_integridade_ok(db_dest)
+    if not integro and exigir_integridade:
+        raise ValueError("Falha na verificação de integridade do snapshot do banco.")
+
+    # Reaproveita o hash do último manifesto quando tamanho e mtime não mudaram
+    anterior=listar_backups(root)
+    conhecidos=anterior[0]["midia"] if anterior else {}
+    midia={}; copiados=0
+    for pasta,_,arquivos in os.walk(MEDIA_ROOT):
+        for arq in arquivos:
+            fp=os.path.join(pasta,arq); rel=os.path.relpath(fp,MEDIA_ROOT).replace(os.sep,"/")
+            stt=os.stat(fp)
+            ant=conhecidos.get(rel)
+            if ant and ant["tamanho"]==stt.st_size and ant["mtime"]==stt.st_mtime:
+                sha=ant["sha256"]
+            else:
+                sha=_sha256(fp)
+            blob=_blob_path(root,sha)
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob),exist_ok=True)
+                shutil.copy2(fp,blob+".tmp"); os.replace(blob+".tmp",blob); copiados+=1
+            midia[rel]={"sha256":sha,"tamanho":stt.st_size,"mtime":stt.st_mtime}
+
+    man={"criado_em":datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+         "db":{"arquivo":os.path.basename(db_dest),"sha256":_sha256(db_dest)},
+         "midia":midia,"midia_copiadas":copiados,"integro":integro}
+    # O manifesto é gravado por último: sem ele o snapshot é ignorado
+    tmp=os.path.join(snap_dir,"manifest.json.tmp")
+    with open(tmp,"w",encoding="utf-8") as f: json.dump(man,f,ensure_ascii=False,indent=1)
+    os.replace(tmp,os.path.join(snap_dir,"manifest.json"))
+    return {"nome":nome,"dir":snap_dir,**man}
+
+def verificar_backup(snap:Dict, root:str=BACKUP_ROOT)->List[str]:
+    """Lista os problemas encontrados no snapshot (vazia = íntegro)."""
+    erros=[]
+    db_snap=os.path.join(snap["dir"],snap["db"]["arquivo"])
+    if not os.path.exists(db_snap): return [f"Banco ausente: {db_snap}"]
+    if _sha256(db_snap)!=snap["db"]["sha256"]: erros.append("Hash do banco não confere.")
+    elif not _integridade_ok(db_snap): erros.append("Banco do snapshot falhou no integrity_check.")
+    for rel,info in snap["midia"].items():
+        blob=_blob_path(root,info["sha256"])
+        if not os.path.exists(blob): erros.append(f"Mídia ausente: {rel}")
+        elif _sha256(blob)!=info["sha256"]: erros.append(f"Mídia corrompida: {rel}")
+    return erros
+
+def restaurar_backup(snap:Dict, root:str=BACKUP_ROOT)->Dict:
+    """Verifica o snapshot, guarda um backup do estado atual e restaura banco e mídias.
+    Arquivos de MEDIA_ROOT que não constam no manifesto são mantidos. Os watermarks dos
+    feeds são zerados: a próxima geração de cada formato é completa. Retorna o backup pré-restauração."""
+    with _backup_lock():
+        erros=verificar_backup(snap,root)
+        if erros: raise ValueError("Snapshot inválido: " + "; ".join(erros[:5]))
+        seguranca=_backup_pre_restauracao(root)
+
+        for rel,info in snap["midia"].items():
+            dest=os.path.join(MEDIA_ROOT,*rel.split("/"))
+            if os.path.exists(dest) and os.path.getsize(dest)==info["tamanho"] and _sha256(dest)==info["sha256"]:
+                continue
+            os.makedirs(os.path.dirname(dest),exist_ok=True)
+            shutil.copy2(_blob_path(root,info["sha256"]),dest+".tmp"); os.replace(dest+".tmp",dest)
+
+        src=sqlite3.connect(os.path.join(snap["dir"],snap["db"]["arquivo"])); dst=get_conn()
+        try:
+            # Sem pausa: o lock de escrita do destino fica preso entre os passos
+            _copiar_db_online(src,dst,pausa=0)
+            # Imóveis criados depois do snapshot somem sem DELETE no changelog e o watermark
+            # restaurado é anterior ao que os portais já receberam: força feed completo
+            dst.execute("DELETE FROM feeds"); dst.execute("DELETE FROM changelog"); dst.commit()
+        finally: src.close(); dst.close()
+        return seguranca
+
+def _backup_pre_restauracao(root:str)->Dict:
+    """Backup do estado atual antes de restaurar, sem abortar se o banco estiver corrompido
+    (é justamente quando se restaura). Em último caso guarda uma cópia bruta dos arquivos."""
+    try:
+        return fazer_backup(root, exigir_integridade=False)
+    except Exception:
+        nome=f"pre-restauracao-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        dest=os.path.join(root,nome); os.makedirs(dest,exist_ok=True)
+        for sufixo in ("","-wal","-shm"):
+            if os.path.exists(DB_PATH+sufixo): shutil.copy2(DB_PATH+sufixo,os.path.join(dest,os.path.basename(DB_PATH)+sufixo))
+        return {"nome":nome,"dir":dest,"integro":False,"bruto":True}
+
+def aplicar_retencao(manter:int, root:str=BACKUP_ROOT)->int:
+    """Mantém os `manter` snapshots mais recentes e remove do store as mídias órfãs."""
+    with _backup_lock():
+        inicio=time.time()
+        snaps=listar_backups(root)
+        for s in snaps[manter:]: shutil.rmtree(s["dir"])
+        usados={info["sha256"] for s in snaps[:manter] for info in s["midia"].values()}
+        store=os.path.join(root,"midia_store")
+        for pasta,_,arquivos in os.walk(store):
+            for arq in arquivos:
+                fp=os.path.join(pasta,arq)
+                # Cópias em andamento e blobs mais novos que a varredura podem ainda não estar num manifesto
+                if arq in usados or arq.endswith(".tmp") or os.stat(fp).st_ctime>=inicio: continue
+                os.remove(fp)
+        return max(len(snaps)-manter,0)
+
+def _ler_agendamento()->Dict:
+    try:
+        with open(BACKUP_AGENDA,encoding="utf-8") as f: d=json.load(f)
+        return {"intervalo_h":float(d.get("intervalo_h",0)),"manter":int(d.get("manter",7))}
+    except (OSError, ValueError):
+        return {"intervalo_h":0.0,"manter":7}
+
+def _salvar_agendamento(intervalo_h:float, manter:int):
+    os.makedirs(BACKUP_ROOT,exist_ok=True)
+    tmp=BACKUP_AGENDA+".tmp"
+    with open(tmp,"w",encoding="utf-8") as f: json.dump({"intervalo_h":intervalo_h,"manter":manter},f)
+    os.replace(tmp,BACKUP_AGENDA)
+
+def _agendador_backup()->Dict:
+    # Um agendador por processo (backup_estado); a configuração fica em BACKUP_AGENDA
+    ag=backup_estado.AGENDADOR
+    with _backup_lock():
+        if not ag["carregado"]:
+            snaps=listar_backups()
+            ag["ultimo"]=datetime.strptime(snaps[0]["criado_em"],"%Y-%m-%d %H:%M:%S").timestamp() if snaps else None
+            ag.update(_ler_agendamento()); ag["carregado"]=True
+    return ag
+
+def _loop_backup(ag:Dict):
+    while ag["intervalo_h"]>0:
+        time.sleep(30)
+        ultimo=ag["ultimo"] or 0
+        if ag["intervalo_h"]>0 and time.time()-ultimo>=ag["intervalo_h"]*3600:
+            try:
+                fazer_backup(); aplicar_retencao(ag["manter"]); ag["erro"]=None
+            except Exception as e:
+                ag["erro"]=str(e)
+            ag["ultimo"]=time.time()
+
+def iniciar_backup_agendado():
+    """Sobe a thread de backup se houver intervalo configurado (chamado a cada execução do main)."""
+    ag=_agendador_backup()
+    if ag["intervalo_h"]>0 and not (ag["thread"] and ag["thread"].is_alive()):
+        ag["thread"]=threading.Thread(target=_loop_backup,args=(ag,),daemon=True,name="backup-agendado")
+        ag["thread"].start()
+
+def configurar_backup_agendado(intervalo_h:float, manter:int):
+    """Liga (intervalo_h>0) ou desliga (0) o backup periódico e persiste a configuração."""
+    _salvar_agendamento(intervalo_h,manter)
+    ag=_agendador_backup()
+    ag["intervalo_h"]=intervalo_h; ag["manter"]=manter
+    iniciar_backup_agendado()
+
+def page_backups():
+    st.title("Backups")
+    if st.button("Fazer backup agora"):
+        try:
+            snap=fazer_backup()
+            st.success(f"Backup {snap['nome']} criado ({len(snap['midia'])} mídia(s), {snap['midia_copiadas']} nova(s)).")
+        except Exception as e:
+            st.error(f"Falha no backup: {e}")
+
+    st.markdown("---"); st.subheader("Backup agendado")
+    ag=_agendador_backup()
+    c1,c2=st.columns(2)
+    intervalo=c1.number_input("Intervalo (horas, 0 = desligado)",0.0,step=1.0,value=float(ag["intervalo_h"]))
+    manter=c2.number_input("Snapshots mantidos",1,step=1,value=int(ag["manter"]))
+    if st.button("Aplicar agendamento"):
+        configurar_backup_agendado(intervalo,int(manter))
+        st.success("Agendamento atualizado." if intervalo>0 else "Backup agendado desligado.")
+    if ag["erro"]: st.error(f"Último backup agendado falhou: {ag['erro']}")
+
+    st.markdown("---"); st.subheader("Restaurar")
+    snaps=listar_backups()
+    if not snaps:
+        st.info("Nenhum backup encontrado."); return
+    st.dataframe(pd.DataFrame([{
+        "Snapshot": s["nome"],
+        "Criado em": s["criado_em"],
+        "Mídias": len(s["midia"]),
+        "Mídias novas": s.get("midia_copiadas",0),
+        "Íntegro": "Sim" if s.get("integro",True) else "Não",
+    } for s in snaps]), use_container_width=True, hide_index=True)
+    opts={s["nome"]: s for s in snaps}
+    escolha=st.selectbox("Snapshot para restaurar", list(opts.keys()))
+    confirmar=st.checkbox("Confirmo que o banco atual será substituído (um backup do estado atual é feito antes)")
+    if st.button("Restaurar snapshot", disabled=not confirmar):
+        try:
+            seguranca=restaurar_backup(opts[escolha])
+            st.success(f"Snapshot {escolha} restaurado. Estado anterior salvo em {seguranca['nome']}. "
+                       "Os watermarks dos feeds foram zerados: a próxima geração de cada formato será completa.")
+            if seguranca.get("bruto"):
+                st.warning(f"O banco anterior não pôde ser copiado pela API de backup; foi guardada uma cópia bruta dos arquivos em {seguranca['dir']}.")
+            elif not seguranca.get("integro",True):
+                st.warning(f"O banco anterior estava corrompido: o snapshot {seguranca['nome']} foi mantido sem verificação de integridade.")
+        except Exception as e:
+            st.error(f"Falha na restauração: {e}")
+
 # ================= Main =================
 def main():
     init_db()
+    iniciar_backup_agendado()
     st.sidebar.title("CRM Imobiliário")
     page=st.sidebar.radio(
         "Navegar",
-        ["Cadastrar Imóvel","Consulta de Imóveis","Interessados","Relatórios"],
+        ["Cadastrar Imóvel","Consulta de Imóveis","Interessados","Relatórios","Feed portais","Backups"],
         index=1  # abre direto na consulta
     )
     if page=="Cadastrar Imóvel": page_cadastrar()
     elif page=="Consulta de Imóveis": page_consulta()
     elif page=="Interessados": page_interessados()
-    else: page_relatorios()
+    elif page=="Relatórios": page_relatorios()
+    elif page=="Feed portais": page_feed()
+    else: page_backups()
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,13 @@
+"""Estado de processo do backup (lock e agendador) do app_imobiliaria_fixed.
+
+Fica num módulo importado e não no script do Streamlit: o script é reexecutado a cada
+rerun e o "Clear cache" limpa o st.cache_resource, mas os globais deste módulo
+duram o processo inteiro. Assim só existe um lock e uma thread de agendamento.
+"""
+import threading
+
+# Backup, restauração e retenção nunca rodam em paralelo (UI x thread agendada)
+LOCK = threading.RLock()
+
+# Preenchido na primeira chamada a _agendador_backup() com a configuração salva em disco
+AGENDADOR = {"carregado": False, "thread": None, "intervalo_h": 0.0, "manter": 7, "ultimo": None, "erro": None}